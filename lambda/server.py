@@ -1,18 +1,21 @@
+import atexit
+import functools
+import hashlib
+import io
 import json
-import requests
+import urllib3
+from urllib3.util.retry import Retry
 import datetime
 import os
-import boto3
-import psycopg2
+import numpy as np
+import pandas as pd
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource("dynamodb")
-rds = boto3.client("rds")
-
 # ------------------------------------------------------------
 
 STATION_ID = os.environ.get("STATION_ID", "46088")
@@ -27,8 +30,33 @@ if not all([TABLE_NAME, DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
 
 URL = f"https://www.ndbc.noaa.gov/data/realtime2/{STATION_ID}.txt"
 
+# Shared across warm invocations so the TLS session to NOAA is reused
+_HTTP = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=2,
+    retries=Retry(total=2, backoff_factor=0.3),
+)
+
+# realtime2 files hold the last 45 days of observations
+REALTIME_WINDOW_DAYS = 45
+
+# /tmp survives warm invocations, so DynamoDB is only read on cold start
+STATE_PATH = f"/tmp/state_{STATION_ID}.json"
+
 RDS_connection_pool = None
 
+# When each pooled connection was last returned; ones idle longer than
+# this are probed before reuse
+_CONN_IDLE_SINCE = {}
+CONNECTION_PROBE_IDLE_SECONDS = 30
+
+# Newest stored timestamp per station, kept across warm invocations
+_LATEST_TS_CACHE = {}
+
+# One worker keeps background DynamoDB writes in order and off the handler's
+# path; the boto3 resource is only ever used from this thread once warm
+_STATE_WRITER = ThreadPoolExecutor(max_workers=1)
+
 # ------------------------------------------------------------
 
 # NOAA Standard Meteorological Data Format
@@ -53,12 +81,75 @@ NOAA_COLUMNS = [
 
 DB_COLUMNS = [col[1] for col in NOAA_COLUMNS]
 
+# NOAA placeholders for a missing measurement
+_MISSING = frozenset({"MM", "", "999", "9999"})
+
+# Names pd.to_datetime understands when assembling a timestamp from columns
+_TIME_COLUMNS = ["year", "month", "day", "hour", "minute"]
+
+# Valid (min, max) per sensor column; columns not listed are unbounded
+SENSOR_LIMITS = {
+    "wind_direction_deg": (0, 360),
+    "wave_direction_deg": (0, 360),
+    "wind_speed_ms": (0, np.inf),
+    "gust_speed_ms": (0, np.inf),
+    "wave_height_m": (0, np.inf),
+    "air_temp_c": (-50, 50),
+    "water_temp_c": (-50, 50),
+    "dewpoint_temp_c": (-50, 50),
+}
+
+# SENSOR_LIMITS as an array aligned with DB_COLUMNS for vectorized checks
+COL_BOUNDS = np.array([SENSOR_LIMITS.get(col, (-np.inf, np.inf)) for col in DB_COLUMNS])
+
+_COLUMNS_SQL = ", ".join(DB_COLUMNS)
+
+# float8 staging columns keep the binary COPY encoding fixed-width; the
+# merge turns NaN back into NULL and casts to DECIMAL server-side
+_STAGE_COLUMNS_SQL = ",\n".join(f"{col} DOUBLE PRECISION" for col in DB_COLUMNS)
+_STAGE_VALUES_SQL = ", ".join(f"NULLIF({col}, 'NaN')" for col in DB_COLUMNS)
+
+_CREATE_STAGE_SQL = f"""
+    CREATE TEMP TABLE buoy_data_stg (
+        station_id VARCHAR(10) NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        {_STAGE_COLUMNS_SQL}
+    )
+    ON COMMIT DROP
+"""
+
+_COPY_SQL = (
+    f"COPY buoy_data_stg (station_id, timestamp, {_COLUMNS_SQL}) FROM STDIN WITH BINARY"
+)
+
+_MERGE_SQL = f"""
+    INSERT INTO buoy_data
+    (station_id, timestamp, {_COLUMNS_SQL})
+    SELECT station_id, timestamp, {_STAGE_VALUES_SQL} FROM buoy_data_stg
+    ON CONFLICT (station_id, timestamp) DO NOTHING
+    RETURNING timestamp
+"""
+
+# PostgreSQL binary COPY framing
+# Reference: https://www.postgresql.org/docs/current/sql-copy.html
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + np.array([0, 0], ">i4").tobytes()
+_COPY_TRAILER = np.array([-1], ">i2").tobytes()
+_PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+# Every field is an int32 byte length followed by the big-endian value
+_COPY_VALUE_FIELDS = [
+    field for col in DB_COLUMNS for field in ((f"{col}_len", ">i4"), (col, ">f8"))
+]
+
 # ------------------------------------------------------------
 
 
 def get_connection_pool():
     global RDS_connection_pool
     if not RDS_connection_pool or RDS_connection_pool.closed:
+        # Imported on first use like boto3; pandas/numpy still dominate init
+        import psycopg2.pool
+
         RDS_connection_pool = psycopg2.pool.SimpleConnectionPool(
             1,
             3,
@@ -67,15 +158,54 @@ def get_connection_pool():
             user=DB_USER,
             password=DB_PASSWORD,
             connect_timeout=5,
+            # Pooled sockets idle between scheduled runs; keep NAT state alive
+            keepalives=1,
+            keepalives_idle=30,
+            # Fail fast on a dead peer or a stuck statement instead of
+            # running out the Lambda timeout
+            tcp_user_timeout=10000,
+            options="-c statement_timeout=10000",
         )
     return RDS_connection_pool
 
 
+def is_connection_alive(conn):
+    """Round-trip to the server; conn.closed misses server-side disconnects"""
+    import psycopg2
+
+    if conn.closed:
+        return False
+    autocommit = conn.autocommit
+    try:
+        # Autocommit keeps the probe to one round trip, no BEGIN/ROLLBACK
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return True
+    except psycopg2.Error:
+        # A dropped socket surfaces as OperationalError, InterfaceError or a
+        # bare DatabaseError depending on when libpq notices it
+        return False
+    finally:
+        if not conn.closed:
+            conn.autocommit = autocommit
+
+
 def get_db_connection(retries=3):
     for attempt in range(retries):
         try:
             pool = get_connection_pool()
-            return pool.getconn()
+            conn = pool.getconn()
+            # Only connections that sat idle in the pool (e.g. while the
+            # execution context was frozen) can have been dropped unnoticed;
+            # freshly opened ones have no idle time and skip the probe
+            stale_before = time.monotonic() - CONNECTION_PROBE_IDLE_SECONDS
+            while _CONN_IDLE_SINCE.pop(conn, stale_before) < stale_before:
+                if is_connection_alive(conn):
+                    break
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            return conn
         except Exception as e:
             if attempt == retries - 1:
                 raise
@@ -86,18 +216,64 @@ def get_db_connection(retries=3):
 def return_connection(conn):
     if conn and RDS_connection_pool and not RDS_connection_pool.closed:
         RDS_connection_pool.putconn(conn)
+        # The pool closes connections beyond minconn; only track kept ones
+        if not conn.closed:
+            _CONN_IDLE_SINCE[conn] = time.monotonic()
+
+
+@atexit.register
+def close_connection_pool():
+    if RDS_connection_pool and not RDS_connection_pool.closed:
+        RDS_connection_pool.closeall()
+
+
+def month_start(dt, offset=0):
+    """First day of the month containing dt, shifted by offset months"""
+    index = dt.year * 12 + dt.month - 1 + offset
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_ddl(now):
+    """DDL for monthly buoy_data partitions covering the realtime2 window"""
+    current = month_start(now)
+    start = month_start(now - datetime.timedelta(days=REALTIME_WINDOW_DAYS))
+
+    # Rows outside every monthly range land here instead of failing the merge
+    statements = [
+        "CREATE TABLE IF NOT EXISTS buoy_data_default PARTITION OF buoy_data DEFAULT;"
+    ]
+    while start <= month_start(now, 1):
+        end = month_start(start, 1)
+        # Current and next month skip WAL; rollover_handler logs them once
+        # the month closes. A crash or failover empties them, which
+        # ensure_table_exists reports through the unlogged epoch token.
+        unlogged = "UNLOGGED " if start >= current else ""
+        statements.append(
+            f"CREATE {unlogged}TABLE IF NOT EXISTS buoy_data_{start:%Y_%m} "
+            f"PARTITION OF buoy_data FOR VALUES FROM ('{start}') TO ('{end}');"
+        )
+        start = end
+
+    return "\n".join(statements)
 
 
 def ensure_table_exists():
-    """Create the buoy_data table with NOAA standard column names"""
+    """
+    Create the partitioned buoy_data table with NOAA standard column names.
+
+    Returns the unlogged epoch token, which changes whenever the server has
+    discarded unlogged data (crash recovery or failover to a standby)
+    """
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cursor:
+            # A pre-partitioning buoy_data is left as is; partitions are only
+            # added when the parent is partitioned (relkind 'p')
             cursor.execute(
-                """
+                f"""
                 CREATE TABLE IF NOT EXISTS buoy_data (
-                    id SERIAL PRIMARY KEY,
+                    id SERIAL,
                     station_id VARCHAR(10) NOT NULL,
                     timestamp TIMESTAMP NOT NULL,
                     wind_direction_deg DECIMAL(5,1),      -- degrees from true N
@@ -115,17 +291,48 @@ def ensure_table_exists():
                     pressure_tendency_hpa DECIMAL(5,1),   -- hPa
                     water_level_ft DECIMAL(6,2),          -- feet above/below MLLW
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, timestamp),
                     UNIQUE(station_id, timestamp)
-                )
+                ) PARTITION BY RANGE (timestamp);
+
+                DO $$
+                BEGIN
+                    IF (SELECT relkind FROM pg_class
+                        WHERE oid = 'buoy_data'::regclass) = 'p' THEN
+                        {partition_ddl(datetime.datetime.utcnow())}
+                    END IF;
+                END $$;
+
+                -- Emptied together with the UNLOGGED partitions
+                CREATE UNLOGGED TABLE IF NOT EXISTS buoy_data_epoch (
+                    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                    epoch UUID NOT NULL DEFAULT gen_random_uuid()
+                );
+                INSERT INTO buoy_data_epoch DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+                SELECT relkind, (SELECT epoch FROM buoy_data_epoch)
+                FROM pg_class WHERE oid = 'buoy_data'::regclass;
             """
             )
+            relkind, epoch = cursor.fetchone()
             conn.commit()
     finally:
         return_connection(conn)
 
+    if relkind != "p":
+        logger.warning(
+            "buoy_data is not partitioned; monthly partitions are skipped "
+            "until it is migrated by hand"
+        )
+
+    return epoch
+
 
 def get_latest_timestamp(station_id):
-    """Get the latest timestamp for a station from RDS"""
+    """Get the latest timestamp for a station, querying RDS only on a cache miss"""
+    if station_id in _LATEST_TS_CACHE:
+        return _LATEST_TS_CACHE[station_id]
+
     conn = None
     try:
         conn = get_db_connection()
@@ -135,6 +342,8 @@ def get_latest_timestamp(station_id):
                 (station_id,),
             )
             result = cur.fetchone()
+            if result[0]:
+                _LATEST_TS_CACHE[station_id] = result[0]
             return result[0] if result[0] else None
     except Exception as e:
         logger.error(f"Error getting latest timestamp: {e}")
@@ -143,85 +352,92 @@ def get_latest_timestamp(station_id):
         return_connection(conn)
 
 
-def validate_sensor_value(val, col_name):
-    """Basic validation for sensor values"""
-    if val is None:
-        return None
-
-    if col_name.endswith("_deg") and not (0 <= val <= 360):
-        return None
-    elif col_name in ["wave_height_m", "wind_speed_ms", "gust_speed_ms"] and val < 0:
-        return None
-    elif col_name.endswith("_c") and not (-50 <= val <= 50):
-        return None
-
-    return val
-
+def parse_noaa_text(text):
+    """Parse a NOAA realtime2 file into validated rows and a parse error count"""
+    df = pd.read_csv(
+        io.StringIO(text),
+        sep=r"\s+",
+        comment="#",
+        header=None,
+        names=[*_TIME_COLUMNS, *DB_COLUMNS],
+        dtype=str,
+        na_values=list(_MISSING),
+        # Extra trailing fields are dropped rather than the row, and never
+        # shift the leading columns into the index
+        usecols=range(len(_TIME_COLUMNS) + len(DB_COLUMNS)),
+        index_col=False,
+    )
+
+    numeric = df[DB_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    arr = numeric.to_numpy(float, copy=True)
+    arr[(arr < COL_BOUNDS[:, 0]) | (arr > COL_BOUNDS[:, 1])] = np.nan
+    values = pd.DataFrame(arr, index=df.index, columns=DB_COLUMNS)
+
+    timestamps = pd.to_datetime(
+        df[_TIME_COLUMNS].apply(pd.to_numeric, errors="coerce"), errors="coerce"
+    )
+    values.insert(0, "timestamp", timestamps)
+
+    valid = timestamps.notna()
+    for row in df[~valid].head(5).itertuples(index=False):
+        line = " ".join("MM" if pd.isna(val) else val for val in row)
+        logger.warning(f"Error parsing line: {line[:50]}...")
+
+    return values[valid], int((~valid).sum())
+
+
+def encode_copy_rows(station_id, rows):
+    """Encode rows as a binary COPY stream for the staging table"""
+    station = station_id.encode()
+    out = np.empty(
+        len(rows),
+        dtype=[
+            ("field_count", ">i2"),
+            ("station_len", ">i4"),
+            ("station", f"S{len(station)}"),
+            ("timestamp_len", ">i4"),
+            ("timestamp", ">i8"),
+            *_COPY_VALUE_FIELDS,
+        ],
+    )
+
+    out["field_count"] = 2 + len(DB_COLUMNS)
+    out["station_len"] = len(station)
+    out["station"] = station
+    out["timestamp_len"] = 8
+    timestamps = rows["timestamp"].to_numpy("datetime64[us]")
+    out["timestamp"] = (timestamps - _PG_EPOCH).view(np.int64)
+    for col in DB_COLUMNS:
+        out[f"{col}_len"] = 8
+        out[col] = rows[col].to_numpy(float)
+
+    return io.BytesIO(_COPY_HEADER + out.tobytes() + _COPY_TRAILER)
+
+
+def insert_buoy_rows(station_id, rows):
+    """Insert new buoy data into RDS; returns (count, newest inserted timestamp)"""
+    if rows.empty:
+        return 0, None
+
+    buf = encode_copy_rows(station_id, rows)
 
-def insert_buoy_rows(station_id, data_rows):
-    """Insert new buoy data into RDS using NOAA standard format"""
-    if not data_rows:
-        return 0
-
-    inserted_count = 0
     conn = None
-    batch_size = 100
 
     try:
         conn = get_db_connection()
         conn.autocommit = False
 
         with conn.cursor() as cur:
-            for i, row in enumerate(data_rows):
-                try:
-                    if len(row) < 5:
-                        continue
-
-                    timestamp = datetime.datetime(*map(int, row[:5]))
-
-                    data_values = []
-                    for idx, val in enumerate(row[5:]):
-                        if val == "MM" or val == "" or val == "999" or val == "9999":
-                            data_values.append(None)
-                        else:
-                            try:
-                                float_val = float(val)
-                                if idx < len(DB_COLUMNS):
-                                    float_val = validate_sensor_value(
-                                        float_val, DB_COLUMNS[idx]
-                                    )
-                                data_values.append(float_val)
-                            except ValueError:
-                                data_values.append(None)
-
-                    while len(data_values) < len(DB_COLUMNS):
-                        data_values.append(None)
-
-                    columns = ", ".join(DB_COLUMNS)
-                    placeholders = ", ".join(["%s"] * len(DB_COLUMNS))
-
-                    cur.execute(
-                        f"""
-                        INSERT INTO buoy_data
-                        (station_id, timestamp, {columns})
-                        VALUES (%s, %s, {placeholders})
-                        ON CONFLICT (station_id, timestamp) DO NOTHING
-                        """,
-                        (station_id, timestamp, *data_values[: len(DB_COLUMNS)]),
-                    )
-
-                    if cur.rowcount > 0:
-                        inserted_count += 1
-
-                    if (i + 1) % batch_size == 0:
-                        conn.commit()
+            cur.execute(_CREATE_STAGE_SQL)
+            cur.copy_expert(_COPY_SQL, buf)
+            cur.execute(_MERGE_SQL)
+            inserted = cur.fetchall()
 
-                except Exception as e:
-                    logger.warning(f"Error inserting row {row}: {e}")
-                    conn.rollback()
-                    continue
+        conn.commit()
 
-            conn.commit()
+        new_ts = rows["timestamp"].max().to_pydatetime()
+        cached_ts = _LATEST_TS_CACHE.get(station_id)
+        _LATEST_TS_CACHE[station_id] = max(cached_ts, new_ts) if cached_ts else new_ts
 
     except Exception as e:
         if conn:
@@ -231,7 +447,105 @@ def insert_buoy_rows(station_id, data_rows):
     finally:
         return_connection(conn)
 
-    return inserted_count
+    return len(inserted), max((r[0] for r in inserted), default=None)
+
+
+@functools.cache
+def get_dynamodb_table():
+    # Warm invocations read state from /tmp, so most never need boto3
+    import boto3
+
+    return boto3.resource("dynamodb").Table(TABLE_NAME)
+
+
+def load_state():
+    """Load ingest state from /tmp, falling back to DynamoDB on cold start"""
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    for attempt in range(3):
+        try:
+            response = get_dynamodb_table().get_item(Key={"station_id": STATION_ID})
+            state = response.get("Item", {})
+            break
+        except Exception as e:
+            if attempt == 2:
+                logger.error(f"Failed to read DynamoDB state: {e}")
+                return {}
+            time.sleep(1)
+
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f)
+    return state
+
+
+def put_state(state):
+    """Write ingest state to DynamoDB"""
+    for attempt in range(3):
+        try:
+            get_dynamodb_table().put_item(Item=state)
+            break
+        except Exception as e:
+            if attempt == 2:
+                logger.error(f"Failed to update DynamoDB state: {e}")
+            else:
+                time.sleep(1)
+
+
+def save_state(state):
+    """Persist ingest state to /tmp, then to DynamoDB in the background"""
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f)
+
+    # Warm invocations read /tmp, so the DynamoDB copy only has to land
+    # before the next cold start
+    _STATE_WRITER.submit(put_state, state)
+
+
+def rollover_handler(event, context):
+    """
+    Scheduled AWS Lambda handler that marks partitions of finished months LOGGED.
+
+    Deploy it as a separate function (handler "server.rollover_handler") on an
+    EventBridge schedule shortly after each month starts, e.g.
+    cron(15 0 1 * ? *). A month left UNLOGGED for longer than the realtime2
+    window can no longer be re-fetched after a crash.
+    """
+    current = f"buoy_data_{month_start(datetime.datetime.utcnow()):%Y_%m}"
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'buoy_data'::regclass
+                  AND c.relpersistence = 'u'
+                ORDER BY c.relname
+                """
+            )
+            closed = [name for (name,) in cur.fetchall() if name < current]
+            for name in closed:
+                cur.execute(f"ALTER TABLE {name} SET LOGGED")
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error in rollover_handler: {e}")
+        raise
+    finally:
+        return_connection(conn)
+
+    logger.info(f"Set {len(closed)} partitions LOGGED: {closed}")
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"logged_partitions": closed}),
+    }
 
 
 def handler(event, context):
@@ -242,32 +556,35 @@ def handler(event, context):
     logger.info(f"Starting request {request_id} for station {STATION_ID}")
 
     try:
-        ensure_table_exists()
-
-        table = dynamodb.Table(TABLE_NAME)
-
-        for attempt in range(3):
-            try:
-                response = table.get_item(Key={"station_id": STATION_ID})
-                state = response.get("Item", {})
-                last_modified = state.get("last_modified")
-                break
-            except Exception as e:
-                if attempt == 2:
-                    logger.error(f"Failed to read DynamoDB state: {e}")
-                    last_modified = None
-                else:
-                    time.sleep(1)
-
-        latest_ts = get_latest_timestamp(STATION_ID)
-
-        session = requests.Session()
+        db_epoch = ensure_table_exists()
+
+        state = load_state()
+        if state.get("db_epoch") != db_epoch:
+            # Unlogged partitions were emptied; forget everything that would
+            # skip re-fetching the rows NOAA still serves
+            logger.warning(f"Database epoch changed to {db_epoch}; resetting state")
+            _LATEST_TS_CACHE.pop(STATION_ID, None)
+            # Only the final state of this invocation is saved; if it fails
+            # first, the next one sees the old epoch and resets again
+            state = {"station_id": STATION_ID, "db_epoch": db_epoch}
+
+        last_modified = state.get("last_modified")
+
         headers = {"If-Modified-Since": last_modified} if last_modified else {}
 
+        # The RDS lookup and NOAA fetch are independent; overlap their RTTs
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fut_ts = executor.submit(get_latest_timestamp, STATION_ID)
+            fut_resp = executor.submit(
+                _HTTP.request, "GET", URL, headers=headers, timeout=30
+            )
+            latest_ts = fut_ts.result()
+
         try:
-            resp = session.get(URL, headers=headers, timeout=30, stream=True)
-            resp.raise_for_status()
-        except requests.exceptions.RequestException as e:
+            resp = fut_resp.result()
+            if resp.status >= 400:
+                raise urllib3.exceptions.HTTPError(f"HTTP {resp.status} for {URL}")
+        except urllib3.exceptions.HTTPError as e:
             logger.error(f"Error fetching data from NOAA: {e}")
             return {
                 "statusCode": 503,
@@ -279,60 +596,37 @@ def handler(event, context):
                 ),
             }
 
-        if resp.status_code == 200:
-            new_data_rows = []
-            parse_errors = 0
-
-            for line in resp.iter_lines(decode_unicode=True):
-                if not line or line.startswith("#"):
-                    continue
-
-                parts = line.split()
-                try:
-                    if len(parts) >= 5:
-                        cur_line_ts = datetime.datetime(*map(int, parts[:5]))
-
-                        if latest_ts and cur_line_ts <= latest_ts:
-                            continue
-
-                        new_data_rows.append(parts)
-                except (ValueError, IndexError) as e:
-                    parse_errors += 1
-                    if parse_errors <= 5:
-                        logger.warning(f"Error parsing line: {line[:50]}... - {e}")
-                    continue
+        if resp.status == 200:
+            # NOAA sometimes rewrites the file without adding rows
+            content_hash = hashlib.blake2b(resp.data, digest_size=16).hexdigest()
+            if content_hash == state.get("content_hash"):
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps(
+                        {
+                            "message": "Data unchanged since last ingest",
+                            "request_id": request_id,
+                        }
+                    ),
+                }
+
+            # realtime2 files are a few hundred KB of ASCII; decode once
+            text = resp.data.decode("ascii", "replace")
+            new_rows, parse_errors = parse_noaa_text(text)
+
+            if latest_ts:
+                new_rows = new_rows[new_rows["timestamp"] > latest_ts]
 
             if parse_errors > 5:
                 logger.warning(f"Total parse errors: {parse_errors}")
 
             inserted_count = 0
-            if new_data_rows:
+            if not new_rows.empty:
                 try:
-                    inserted_count = insert_buoy_rows(STATION_ID, new_data_rows)
+                    inserted_count, inserted_ts = insert_buoy_rows(STATION_ID, new_rows)
 
                     if inserted_count > 0:
-                        latest_ts = datetime.datetime(*map(int, new_data_rows[0][:5]))
-                        for attempt in range(3):
-                            try:
-                                table.put_item(
-                                    Item={
-                                        "station_id": STATION_ID,
-                                        "last_modified": resp.headers.get(
-                                            "Last-Modified"
-                                        ),
-                                        "latest_ts": latest_ts.isoformat(),
-                                        "request_id": request_id,
-                                        "updated_at": datetime.datetime.utcnow().isoformat(),
-                                    }
-                                )
-                                break
-                            except Exception as e:
-                                if attempt == 2:
-                                    logger.error(
-                                        f"Failed to update DynamoDB state: {e}"
-                                    )
-                                else:
-                                    time.sleep(1)
+                        latest_ts = inserted_ts
 
                 except Exception as e:
                     logger.error(f"Failed to insert data: {e}")
@@ -342,17 +636,33 @@ def handler(event, context):
                             {
                                 "error": "Failed to insert data",
                                 "request_id": request_id,
-                                "rows_processed": len(new_data_rows),
+                                "rows_processed": len(new_rows),
                             }
                         ),
                     }
 
+            # Saved even when nothing was inserted, so a rewrite without new
+            # rows (or one that only drops old rows) matches the hash next time
+            save_state(
+                {
+                    "station_id": STATION_ID,
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "latest_ts": (
+                        latest_ts.isoformat() if latest_ts else state.get("latest_ts")
+                    ),
+                    "content_hash": content_hash,
+                    "db_epoch": db_epoch,
+                    "request_id": request_id,
+                    "updated_at": datetime.datetime.utcnow().isoformat(),
+                },
+            )
+
             return {
                 "statusCode": 200,
                 "body": json.dumps(
                     {
                         "message": f"Successfully inserted {inserted_count} new records",
-                        "total_rows_processed": len(new_data_rows),
+                        "total_rows_processed": len(new_rows),
                         "parse_errors": parse_errors,
                         "latest_timestamp": (
                             latest_ts.isoformat() if latest_ts else None
@@ -362,7 +672,7 @@ def handler(event, context):
                 ),
             }
 
-        elif resp.status_code == 304:
+        elif resp.status == 304:
             return {
                 "statusCode": 200,
                 "body": json.dumps(
@@ -375,10 +685,10 @@ def handler(event, context):
 
         else:
             return {
-                "statusCode": resp.status_code,
+                "statusCode": resp.status,
                 "body": json.dumps(
                     {
-                        "error": f"Unexpected status code: {resp.status_code}",
+                        "error": f"Unexpected status code: {resp.status}",
                         "request_id": request_id,
                     }
                 ),
@@ -392,6 +702,3 @@ def handler(event, context):
                 {"error": "Internal server error", "request_id": request_id}
             ),
         }
-    finally:
-        if RDS_connection_pool and not RDS_connection_pool.closed:
-            RDS_connection_pool.closeall()
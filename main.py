@@ -1,80 +1,125 @@
-import requests
-import time
+import aiohttp
+import asyncio
 import datetime
 import csv
 import os
 
 HEADER_LINE = 0
 HEADER_TYPE_LINE = 1
-DATE_RANGE = slice(0, 5)
 DATA_RANGE = slice(6, 19)
+POLL_INTERVAL = 30 * 60
 
-STATION_ID = "46088"
-URL = f"https://www.ndbc.noaa.gov/data/realtime2/{STATION_ID}.txt"
+STATION_IDS = ["46088"]
+URL = "https://www.ndbc.noaa.gov/data/realtime2/{station_id}.txt"
 
-session = requests.Session()
 
-last_modified = None
-latest_ts = None
-header_written = False
+def parse_timestamp(parts):
+    return datetime.datetime(
+        int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3]), int(parts[4])
+    )
 
-while True:
-    headers = {"If-Modified-Since": last_modified} if last_modified else {}
-    resp = session.get(URL, headers=headers, timeout=30, stream=True)
 
-    if resp.status_code == 200:
-        lines = []
-        header_lines = []
+def write_rows(station_id, header_line, lines, header_written):
+    """Append rows to the station CSV; returns whether the header is written"""
+    csv_file = f"./data/stations/{station_id}.csv"
 
-        for line in resp.iter_lines(decode_unicode=True):
-            if not line:
-                continue
+    write_header = not header_written and (
+        not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0
+    )
 
-            if line.startswith("#"):
-                header_lines.append(line[1:].strip())
-                continue
+    with open(csv_file, "a", newline="") as f:
+        writer = csv.writer(f)
 
-            parts = line.split()
-            try:
-                cur_line_ts = datetime.datetime(*map(int, parts[DATE_RANGE]))
-            except (ValueError, IndexError):
-                continue
+        if write_header and header_line:
+            writer.writerow(header_line.split())
+            header_written = True
 
-            if latest_ts and cur_line_ts <= latest_ts:
-                break
+        for line in lines:
+            data = line.split()[DATA_RANGE]
+            writer.writerow(data)
+            print(station_id, data)
 
-            lines.append(line)
+    return header_written
 
-        if lines:
-            parts = lines[0].split()
-            latest_ts = datetime.datetime(*map(int, parts[DATE_RANGE]))
 
-            csv_file = f"./data/stations/{STATION_ID}.csv"
+async def poll(session, station_id):
+    url = URL.format(station_id=station_id)
 
-            write_header = not header_written and (
-                not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0
-            )
+    last_modified = None
+    latest_ts = None
+    header_written = False
 
-            with open(csv_file, "a", newline="") as f:
-                writer = csv.writer(f)
+    while True:
+        headers = {"If-Modified-Since": last_modified} if last_modified else {}
 
-                if write_header and header_lines:
-                    writer.writerow(header_lines[0].split())
-                    header_written = True
+        try:
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 200:
+                    lines = []
+                    header_lines = []
 
-                for line in lines:
-                    data = line.split()[DATA_RANGE]
-                    writer.writerow(data)
-                    print(data)
+                    async for raw_line in resp.content:
+                        line = raw_line.decode().strip()
+                        if not line:
+                            continue
 
-        resp.close()
-        last_modified = resp.headers.get("Last-Modified")
+                        if line.startswith("#"):
+                            header_lines.append(line[1:].strip())
+                            continue
 
-    elif resp.status_code == 304:
-        print("Already up to date.")
+                        parts = line.split()
+                        try:
+                            cur_line_ts = parse_timestamp(parts)
+                        except (ValueError, IndexError):
+                            continue
 
-    else:
-        print(f"Unexpected status {resp.status_code}")
-        break
+                        if latest_ts and cur_line_ts <= latest_ts:
+                            break
 
-    time.sleep(30 * 60)
+                        lines.append(line)
+
+                    if lines:
+                        latest_ts = parse_timestamp(lines[0].split())
+
+                        # File I/O off the event loop so other stations keep polling
+                        header_written = await asyncio.to_thread(
+                            write_rows,
+                            station_id,
+                            header_lines[0] if header_lines else None,
+                            lines,
+                            header_written,
+                        )
+
+                    last_modified = resp.headers.get("Last-Modified")
+
+                elif resp.status == 304:
+                    print(f"{station_id}: Already up to date.")
+
+                else:
+                    print(f"{station_id}: Unexpected status {resp.status}")
+                    break
+
+        except (aiohttp.ClientError, TimeoutError) as e:
+            # Keep this station on schedule; one bad poll must not stop the rest
+            print(f"{station_id}: Request failed: {e!r}")
+
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def main():
+    # One keep-alive pool shared by every station, reused across polls
+    connector = aiohttp.TCPConnector(limit=8, keepalive_timeout=3600)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(
+            *(poll(session, station_id) for station_id in STATION_IDS),
+            return_exceptions=True,
+        )
+
+    for station_id, result in zip(STATION_IDS, results, strict=True):
+        if isinstance(result, Exception):
+            print(f"{station_id}: Poller stopped: {result!r}")
+
+
+asyncio.run(main())